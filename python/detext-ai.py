@@ -1,97 +1,98 @@
 import numpy as np
-import joblib
-import csv
+import scipy.fft
+import xgboost as xgb
 import os
 import json
 import sys
 
 INTERVAL_LENGTH = 500
+# FFT halves, derivatives and raw series of both rows of a segment
+NUM_FEATURES = 2 * (INTERVAL_LENGTH // 2) + 4 * INTERVAL_LENGTH
 
 # If you need any functions from your original script (like segmenting or feature extraction),
 # either copy them here or import them from a shared module.
 
-# Example of how to load
-clf = joblib.load("copy_detector_model_030_logloss.joblib")
-threshold_data = joblib.load("optimal_threshold_030_logloss.joblib")
-best_thresh = threshold_data["optimal_threshold"]
+# Load XGBoost model (native format, used through the booster directly) and threshold
+booster = xgb.Booster()
+booster.load_model("copy_detector_model_030_logloss.ubj")
+with open("optimal_threshold_030_logloss.json") as f:
+    best_thresh = json.load(f)["optimal_threshold"]
 
-def compute_fft_features(segment):
+def compute_fft_features(segments, out):
     """
-    Computes FFT features along with derivatives and raw time series for a single segment.
-    segment: numpy array of shape (2, interval_length)
+    Computes FFT features along with derivatives and raw time series for a batch of segments.
+    segments: numpy array of shape (num_segments, 2, interval_length)
+    out: preallocated feature matrix of shape (num_segments, NUM_FEATURES), filled in place
     """
-    # Extract backspace and key series
-    backspace_series = segment[0]
-    key_series = segment[1]
-
-    # Compute FFT
-    fft_backspaces = np.abs(np.fft.fft(backspace_series))
-    fft_keys = np.abs(np.fft.fft(key_series))
-
-    # Use only first half (due to symmetry)
-    half_length = len(backspace_series) // 2
-    fft_backspaces = fft_backspaces[:half_length]
-    fft_keys = fft_keys[:half_length]
-
-    # Compute derivatives (rate of change)
-    backspace_derivatives = np.diff(backspace_series, prepend=backspace_series[0])
-    keystroke_derivatives = np.diff(key_series, prepend=key_series[0])
-
-    # Combine all features
-    return np.concatenate(
-        [
-            fft_backspaces,  # FFT of backspace series
-            fft_keys,  # FFT of keystroke series
-            backspace_derivatives,  # Rate of change of backspaces
-            keystroke_derivatives,  # Rate of change of keystrokes
-            backspace_series,  # Original backspace series
-            key_series,  # Original keystroke series
-        ]
-    )
+    num_segments, num_series, length = segments.shape
+    half_length = length // 2
+
+    # Views into out, one row per backspace/key series of every segment
+    fft_offset = num_series * half_length
+    diff_offset = fft_offset + num_series * length
+    fft_magnitudes = out[:, :fft_offset].reshape(num_segments, num_series, half_length)
+    derivatives = out[:, fft_offset:diff_offset].reshape(num_segments, num_series, length)
+    raw_series = out[:, diff_offset:].reshape(num_segments, num_series, length)
+
+    # Real FFT of every series in a single batched call, it only computes the
+    # non-redundant half of the spectrum (length // 2 + 1 bins)
+    spectrum = scipy.fft.rfft(segments.astype(out.dtype), axis=-1, workers=-1)
+    np.abs(spectrum[..., :half_length], out=fft_magnitudes)
+
+    # Derivatives (rate of change), the first sample has no predecessor
+    derivatives[..., 0] = 0
+    np.subtract(segments[..., 1:], segments[..., :-1], out=derivatives[..., 1:])
+
+    # Original series
+    raw_series[...] = segments
+    return out
 
 
 def segment_signal(signal, interval_length):
     """
     Divides a 2 x total_samples signal into intervals of length interval_length.
     Centers each segment by subtracting its first value.
+    Returns an array of shape (num_intervals, 2, interval_length).
     """
     num_intervals = signal.shape[1] // interval_length
-    segments = []
-
-    for i in range(num_intervals):
-        # Extract segment
-        segment = signal[:, i * interval_length : (i + 1) * interval_length].copy()
 
-        # Center each row of the segment by subtracting its first value
-        segment[0] = segment[0] - segment[0][0]
-        segment[1] = segment[1] - segment[1][0]
+    # Split the signal into segments with a single reshape
+    segments = (
+        signal[:, : num_intervals * interval_length]
+        .reshape(signal.shape[0], num_intervals, interval_length)
+        .transpose(1, 0, 2)
+        .copy()
+    )
 
-        segments.append(segment)
+    # Center each row of every segment by subtracting its first value
+    segments -= segments[:, :, 0:1]
 
     return segments
 
 
 def extract_features(segments, feature_extractor):
-    """Extract features from segments using the provided feature extractor"""
-    features = []
-    for segment in segments:
-        if feature_extractor:
-            feature_vector = feature_extractor(segment)
-            features.append(feature_vector)
+    """Extract features from all segments with a single batched call to the feature extractor"""
+    # float32 is what XGBoost works with internally, so the matrix is passed on without a copy
+    X = np.empty((len(segments), NUM_FEATURES), dtype=np.float32)
+    feature_extractor(segments, X)
 
-    return np.array(features)
+    return X
 
 def predict_file(file_path, model, threshold):
-    with open(file_path, "r") as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-    
-    # Convert each row of strings to integers
-    chars_typed = np.array([int(x) for x in rows[0]])
-    backspaces = np.array([int(x) for x in rows[1]])
+    # Parse the chars typed and backspaces rows straight into integers
+    rows = np.loadtxt(file_path, dtype=np.int32, delimiter=",", max_rows=2, ndmin=2)
+
+    # Check if we have enough data for at least one segment. A recording saved
+    # before its first sample has empty rows, which load as no rows at all.
+    if rows.shape[0] < 2 or rows.shape[1] < INTERVAL_LENGTH:
+        return {
+            "copy_percentage": 0.0,
+            "overall_prediction": "INSUFFICIENT DATA",
+            "num_segments": 0
+        }
 
-    # Create signal array
-    signal = np.vstack((backspaces, chars_typed))
+    # Create signal array (backspaces, chars typed)
+    signal = rows[[1, 0]]
 
     # Segment the signal
     segments = segment_signal(signal, interval_length=INTERVAL_LENGTH)
@@ -100,7 +101,7 @@ def predict_file(file_path, model, threshold):
     X_test = extract_features(segments, feature_extractor=compute_fft_features)
 
     # Make predictions
-    y_prob = model.predict_proba(X_test)[:, 1]
+    y_prob = model.inplace_predict(X_test)
     y_pred = (y_prob >= threshold).astype(int)
 
     # Calculate overall prediction
@@ -116,10 +117,11 @@ def predict_file(file_path, model, threshold):
     }
 
 path = sys.argv[1]
-results = predict_file(path, clf, best_thresh)
+results = predict_file(path, booster, best_thresh)
 
 print(f"Number of segments: {results['num_segments']}")
-print(f"Predictions: {results['segment_predictions']}")
-print(f"Average prediction: {np.mean(results['segment_predictions'])}")
-print(f"Percentage of segments classified as copied: {results['copy_percentage']:.2f}%")
+if results["num_segments"] > 0:
+    print(f"Predictions: {results['segment_predictions']}")
+    print(f"Average prediction: {np.mean(results['segment_predictions'])}")
+    print(f"Percentage of segments classified as copied: {results['copy_percentage']:.2f}%")
 print(f"Overall classification: {results['overall_prediction']}")
\ No newline at end of file
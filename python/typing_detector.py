@@ -1,81 +1,98 @@
 import pygame
+import bisect
 import csv
+import json
 import sys
 import math
 import numpy as np
-import joblib
+import scipy.fft
+import xgboost as xgb
 import tempfile
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-# Load XGBoost model and threshold
-clf = joblib.load("copy_detector_model_030_logloss.joblib")
-threshold_data = joblib.load("optimal_threshold_030_logloss.joblib")
-best_thresh = threshold_data["optimal_threshold"]
+# Load XGBoost model (native format, used through the booster directly) and threshold
+booster = xgb.Booster()
+booster.load_model("copy_detector_model_030_logloss.ubj")
+with open("optimal_threshold_030_logloss.json") as f:
+    best_thresh = json.load(f)["optimal_threshold"]
 
 INTERVAL_LENGTH = 500
+# FFT halves, derivatives and raw series of both rows of a segment
+NUM_FEATURES = 2 * (INTERVAL_LENGTH // 2) + 4 * INTERVAL_LENGTH
+# Initial capacity of the sample buffers, one hour at 10 samples per second
+SAMPLE_BUFFER_SIZE = 36000
 
-def compute_fft_features(segment):
+# Layout and rendered surfaces of each line of the editor text, see get_line_layout
+_line_cache = {}
+
+# Probability of each analyzed segment by start sample, with the segment signature.
+# The series are cumulative counters that only grow, so a complete segment never
+# changes and only newly completed segments have to go through the model.
+_segment_cache = {}
+
+def compute_fft_features(segments, out):
     """
-    Computes FFT features along with derivatives and raw time series for a single segment.
+    Computes FFT features along with derivatives and raw time series for a batch of segments.
+    segments: numpy array of shape (num_segments, 2, interval_length)
+    out: preallocated feature matrix of shape (num_segments, NUM_FEATURES), filled in place
     """
-    # Extract backspace and key series
-    backspace_series = segment[0]
-    key_series = segment[1]
-
-    # Compute FFT
-    fft_backspaces = np.abs(np.fft.fft(backspace_series))
-    fft_keys = np.abs(np.fft.fft(key_series))
-
-    # Use only first half (due to symmetry)
-    half_length = len(backspace_series) // 2
-    fft_backspaces = fft_backspaces[:half_length]
-    fft_keys = fft_keys[:half_length]
-
-    # Compute derivatives (rate of change)
-    backspace_derivatives = np.diff(backspace_series, prepend=backspace_series[0])
-    keystroke_derivatives = np.diff(key_series, prepend=key_series[0])
-
-    # Combine all features
-    return np.concatenate(
-        [
-            fft_backspaces,  # FFT of backspace series
-            fft_keys,  # FFT of keystroke series
-            backspace_derivatives,  # Rate of change of backspaces
-            keystroke_derivatives,  # Rate of change of keystrokes
-            backspace_series,  # Original backspace series
-            key_series,  # Original keystroke series
-        ]
-    )
+    num_segments, num_series, length = segments.shape
+    half_length = length // 2
+
+    # Views into out, one row per backspace/key series of every segment
+    fft_offset = num_series * half_length
+    diff_offset = fft_offset + num_series * length
+    fft_magnitudes = out[:, :fft_offset].reshape(num_segments, num_series, half_length)
+    derivatives = out[:, fft_offset:diff_offset].reshape(num_segments, num_series, length)
+    raw_series = out[:, diff_offset:].reshape(num_segments, num_series, length)
+
+    # Real FFT of every series in a single batched call, it only computes the
+    # non-redundant half of the spectrum (length // 2 + 1 bins)
+    spectrum = scipy.fft.rfft(segments.astype(out.dtype), axis=-1, workers=-1)
+    np.abs(spectrum[..., :half_length], out=fft_magnitudes)
+
+    # Derivatives (rate of change), the first sample has no predecessor
+    derivatives[..., 0] = 0
+    np.subtract(segments[..., 1:], segments[..., :-1], out=derivatives[..., 1:])
+
+    # Original series
+    raw_series[...] = segments
+    return out
 
 def segment_signal(signal, interval_length):
     """
     Divides a 2 x total_samples signal into intervals of length interval_length.
     Centers each segment by subtracting its first value.
+    Returns an array of shape (num_intervals, 2, interval_length).
     """
     num_intervals = signal.shape[1] // interval_length
-    segments = []
 
-    for i in range(num_intervals):
-        # Extract segment
-        segment = signal[:, i * interval_length : (i + 1) * interval_length].copy()
-
-        # Center each row of the segment by subtracting its first value
-        segment[0] = segment[0] - segment[0][0]
-        segment[1] = segment[1] - segment[1][0]
+    # Split the signal into segments with a single reshape
+    segments = (
+        signal[:, : num_intervals * interval_length]
+        .reshape(signal.shape[0], num_intervals, interval_length)
+        .transpose(1, 0, 2)
+        .copy()
+    )
 
-        segments.append(segment)
+    # Center each row of every segment by subtracting its first value
+    segments -= segments[:, :, 0:1]
 
     return segments
 
 def extract_features(segments, feature_extractor):
-    """Extract features from segments using the provided feature extractor"""
-    features = []
-    for segment in segments:
-        if feature_extractor:
-            feature_vector = feature_extractor(segment)
-            features.append(feature_vector)
+    """Extract features from all segments with a single batched call to the feature extractor"""
+    # float32 is what XGBoost works with internally, so the matrix is passed on without a copy
+    X = np.empty((len(segments), NUM_FEATURES), dtype=np.float32)
+    feature_extractor(segments, X)
 
-    return np.array(features)
+    return X
+
+def _segment_signature(signal, start):
+    """First and last samples of the segment starting at start"""
+    end = start + INTERVAL_LENGTH - 1
+    return tuple(signal[:, start]), tuple(signal[:, end])
 
 def predict_typing(chars_typed_series, backspaces_series, model, threshold):
     """
@@ -83,7 +100,7 @@ def predict_typing(chars_typed_series, backspaces_series, model, threshold):
     Returns the prediction for each segment and the overall prediction.
     """
     # Create signal array
-    signal = np.vstack((np.array(backspaces_series), np.array(chars_typed_series)))
+    signal = np.vstack((backspaces_series, chars_typed_series))
 
     # Check if we have enough data for at least one segment
     if signal.shape[1] < INTERVAL_LENGTH:
@@ -93,79 +110,101 @@ def predict_typing(chars_typed_series, backspaces_series, model, threshold):
             "num_segments": 0
         }
 
-    # Segment the signal
-    segments = segment_signal(signal, interval_length=INTERVAL_LENGTH)
-
-    # Extract features
-    X_test = extract_features(segments, feature_extractor=compute_fft_features)
-
-    # Make predictions
-    if len(X_test) > 0:
-        y_prob = model.predict_proba(X_test)[:, 1]
-        y_pred = (y_prob >= threshold).astype(int)
-
-        # Calculate overall prediction
-        copy_percentage = np.mean(y_pred) * 100
-        overall_prediction = "COPIED" if np.mean(y_pred) >= 0.5 else "NOT COPIED"
+    num_segments = signal.shape[1] // INTERVAL_LENGTH
 
-        return {
-            "segment_predictions": y_pred,
-            "segment_probabilities": y_prob,
-            "copy_percentage": copy_percentage,
-            "overall_prediction": overall_prediction,
-            "num_segments": len(segments)
-        }
-    else:
-        return {
-            "copy_percentage": 0.0,
-            "overall_prediction": "INSUFFICIENT DATA",
-            "num_segments": 0
-        }
+    # Reuse the probabilities of segments that were already analyzed
+    y_prob = np.empty(num_segments)
+    missing = []
+    for i in range(num_segments):
+        start = i * INTERVAL_LENGTH
+        cached = _segment_cache.get(start)
+        if cached is not None and cached[0] == _segment_signature(signal, start):
+            y_prob[i] = cached[1]
+        else:
+            missing.append(i)
+
+    if missing:
+        # Segment the signal and extract features of the new segments only
+        segments = segment_signal(signal, interval_length=INTERVAL_LENGTH)[missing]
+        X_test = extract_features(segments, feature_extractor=compute_fft_features)
+
+        # Make predictions
+        y_prob[missing] = model.inplace_predict(X_test)
+        for i in missing:
+            start = i * INTERVAL_LENGTH
+            _segment_cache[start] = (_segment_signature(signal, start), y_prob[i])
+
+    y_pred = (y_prob >= threshold).astype(int)
+
+    # Calculate overall prediction
+    copy_percentage = np.mean(y_pred) * 100
+    overall_prediction = "COPIED" if np.mean(y_pred) >= 0.5 else "NOT COPIED"
+
+    return {
+        "segment_predictions": y_pred,
+        "segment_probabilities": y_prob,
+        "copy_percentage": copy_percentage,
+        "overall_prediction": overall_prediction,
+        "num_segments": num_segments
+    }
 
-def find_cursor_pos_from_click(mx, my, typed_text, font, line_spacing, scroll_offset, x_offset, top_margin):
-    lines = typed_text.split("\n")
+def get_line_layout(line, font):
+    """
+    Returns the cached (height, width of every prefix, text surface, shadow surface)
+    of a line of text. Lines are keyed by their content, so edited lines simply miss.
+    Prefix widths start out unmeasured (-1), see get_prefix_width.
+    """
+    layout = _line_cache.get(line)
+    if layout is None:
+        text_surf = font.render(line, True, (255, 255, 255))
+        shadow = font.render(line, True, (0, 0, 0))
+        prefix_widths = np.full(len(line) + 1, -1)
+        prefix_widths[0] = 0
+        layout = (text_surf.get_height(), prefix_widths, text_surf, shadow)
+        _line_cache[line] = layout
+    return layout
+
+def get_prefix_width(line, col, font):
+    """
+    Width in pixels of the first col characters of a line. Each prefix is measured
+    at most once per line, and only when the caret, a click or auto-wrap needs it.
+    """
+    prefix_widths = get_line_layout(line, font)[1]
+    if prefix_widths[col] < 0:
+        prefix_widths[col] = font.size(line[:col])[0]
+    return int(prefix_widths[col])
+
+def prune_line_cache(lines):
+    """Drops cached layouts of lines that are no longer part of the text"""
+    if len(_line_cache) > 2 * len(lines):
+        current = set(lines)
+        for line in [line for line in _line_cache if line not in current]:
+            del _line_cache[line]
+
+def find_cursor_pos_from_click(mx, my, lines, font, line_spacing, scroll_offset, x_offset, top_margin):
+    """Returns the (line, column) of the caret position closest to a click"""
     y = scroll_offset
-    total_pos = 0
-    for line in lines:
-        line_surf = font.render(line, True, (255, 255, 255))
-        line_height = line_surf.get_height()
+    for line_index, line in enumerate(lines):
+        line_height = get_line_layout(line, font)[0]
         line_top = y
         line_bottom = y + line_height
         if line_top <= my <= line_bottom:
-            running_width = x_offset
-            best_char_index = len(line)
-            for i, ch in enumerate(line):
-                ch_width = font.size(ch)[0]
-                if mx < running_width + ch_width / 2:
-                    best_char_index = i
-                    break
-                running_width += ch_width
-            return total_pos + best_char_index
+            # First character whose horizontal midpoint is right of the click. Prefix widths
+            # grow with the column, so a binary search only measures O(log n) prefixes.
+            best_char_index = bisect.bisect_right(
+                range(len(line)), mx - x_offset,
+                key=lambda col: (get_prefix_width(line, col, font) + get_prefix_width(line, col + 1, font)) / 2
+            )
+            return line_index, best_char_index
         y += line_height + line_spacing
-        total_pos += len(line) + 1
-    return len(typed_text)
+    return len(lines) - 1, len(lines[-1])
 
-def get_caret_xy(typed_text, cursor_pos, font, line_spacing, scroll_offset, x_offset):
-    lines = typed_text.split("\n")
-    pos_left = cursor_pos
+def get_caret_xy(lines, cur_line, cur_col, font, line_spacing, scroll_offset, x_offset):
     y = scroll_offset
-    for line in lines:
-        line_surf = font.render(line, True, (255, 255, 255))
-        line_height = line_surf.get_height()
-        n = len(line) + 1
-        if pos_left < n:
-            sub_str = line[:pos_left]
-            caret_x = x_offset + font.size(sub_str)[0]
-            caret_y = y
-            return caret_x, caret_y, line_height
-        y += line_height + line_spacing
-        pos_left -= n
-    if lines:
-        last_line = lines[-1]
-    else:
-        last_line = ""
-    line_surf = font.render(last_line, True, (255, 255, 255))
-    return x_offset + font.size(last_line)[0], y, line_surf.get_height()
+    for line in lines[:cur_line]:
+        y += get_line_layout(line, font)[0] + line_spacing
+    line_height = get_line_layout(lines[cur_line], font)[0]
+    return x_offset + get_prefix_width(lines[cur_line], cur_col, font), y, line_height
 
 def draw_text_with_outline(screen, text, font, x, y, text_color, outline_color=(0, 0, 0), offset=1):
     # Render text with outline
@@ -189,18 +228,26 @@ def main():
     screen = pygame.display.set_mode((screen_width, screen_height))
     pygame.display.set_caption("DeText AI")
 
+    # Background gradient, built once and blitted every frame
+    color_values = 20 + np.minimum(35, (np.arange(screen_height) * 0.2).astype(int))
+    gradient = np.stack((color_values, color_values, color_values + 10), axis=-1)
+    gradient_surf = pygame.Surface((screen_width, screen_height))
+    pygame.surfarray.blit_array(gradient_surf, np.broadcast_to(gradient, (screen_width, screen_height, 3)))
+
     clock = pygame.time.Clock()
     font = pygame.font.SysFont(None, 32)
     ui_font = pygame.font.SysFont(None, 24)
     title_font = pygame.font.SysFont(None, 40, bold=True)
 
-    # Text editing state
-    typed_text = ""
-    cursor_pos = 0
+    # Text editing state, one string per line with the caret at (cur_line, cur_col)
+    lines = [""]
+    cur_line = 0
+    cur_col = 0
 
-    # Data collection lists
-    chars_typed_series = []
-    backspaces_series = []
+    # Data collection buffers, only the first num_samples entries are filled
+    chars_typed_series = np.empty(SAMPLE_BUFFER_SIZE, dtype=np.int32)
+    backspaces_series = np.empty(SAMPLE_BUFFER_SIZE, dtype=np.int32)
+    num_samples = 0
     mouse_x_series = []
     mouse_y_series = []
 
@@ -216,6 +263,10 @@ def main():
     analysis_interval = 1000  # Analyze every 1 second
     analysis_elapsed = 0
     
+    # Background analysis
+    analysis_executor = ThreadPoolExecutor(max_workers=1)
+    analysis_future = None
+
     # Results
     copy_results = {
         "copy_percentage": 0.0,
@@ -258,34 +309,55 @@ def main():
             cursor_visible = not cursor_visible
             time_since_blink = 0
 
+        # Left clicks are handled after the thumb geometry is calculated
+        lmb_down_events = []
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
 
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_BACKSPACE:
-                    if cursor_pos > 0:
-                        typed_text = typed_text[:cursor_pos - 1] + typed_text[cursor_pos:]
-                        cursor_pos -= 1
+                    line = lines[cur_line]
+                    if cur_col > 0:
+                        lines[cur_line] = line[:cur_col - 1] + line[cur_col:]
+                        cur_col -= 1
+                    elif cur_line > 0:
+                        # Join with the previous line
+                        cur_line -= 1
+                        cur_col = len(lines[cur_line])
+                        lines[cur_line] += lines.pop(cur_line + 1)
                     total_backspaces_typed += 1
                 elif event.key == pygame.K_RETURN:
-                    typed_text = typed_text[:cursor_pos] + "\n" + typed_text[cursor_pos:]
-                    cursor_pos += 1
+                    line = lines[cur_line]
+                    lines[cur_line:cur_line + 1] = [line[:cur_col], line[cur_col:]]
+                    cur_line += 1
+                    cur_col = 0
                     total_chars_typed += 1
                 elif event.key == pygame.K_s and pygame.key.get_mods() & pygame.KMOD_CTRL:
                     # Save keystroke data to CSV on Ctrl+S
                     with open("keystrokes.csv", "w", newline="") as f:
                         w = csv.writer(f)
-                        w.writerow(backspaces_series)
-                        w.writerow(chars_typed_series)
+                        w.writerow(backspaces_series[:num_samples])
+                        w.writerow(chars_typed_series[:num_samples])
                     
                     # Save the actual text content
                     with open("text_content.txt", "w", encoding="utf-8") as f:
-                        f.write(typed_text)
+                        f.write("\n".join(lines))
                     
                     # Immediately evaluate the data
-                    if len(chars_typed_series) >= INTERVAL_LENGTH:
-                        copy_results = predict_typing(chars_typed_series, backspaces_series, clf, best_thresh)
+                    if num_samples >= INTERVAL_LENGTH:
+                        # A pending periodic analysis is older than this one, drop its result
+                        # so it does not overwrite the newer results afterwards
+                        if analysis_future is not None:
+                            analysis_future.result()
+                            analysis_future = None
+
+                        # Run on the analysis thread too, so predict_typing never runs concurrently
+                        copy_results = analysis_executor.submit(
+                            predict_typing,
+                            chars_typed_series[:num_samples], backspaces_series[:num_samples], booster, best_thresh
+                        ).result()
                         status_message = f"Data and text saved. Analysis: {copy_results['copy_percentage']:.1f}% copied"
                         
                         # Set status color based on copy percentage
@@ -301,24 +373,24 @@ def main():
                         status_color = (100, 255, 100)
                 else:
                     # Insert the character
-                    typed_text = typed_text[:cursor_pos] + event.unicode + typed_text[cursor_pos:]
-                    cursor_pos += 1
+                    line = lines[cur_line]
+                    lines[cur_line] = line[:cur_col] + event.unicode + line[cur_col:]
+                    cur_col += len(event.unicode)
                     total_chars_typed += 1
 
-                    # Auto-wrap: Check if the current line exceeds the available width.
-                    # Extract the current line (everything after the last newline)
-                    current_line = typed_text[:cursor_pos].rsplit("\n", 1)[-1]
+                    # Auto-wrap: Check if the current line up to the caret exceeds the available width.
                     # Define a threshold (window width minus text offset and a margin)
                     threshold = screen_width - x_text_offset - scrollbar_width - 40
-                    if font.size(current_line)[0] > threshold:
-                        typed_text = typed_text[:cursor_pos] + "\n" + typed_text[cursor_pos:]
-                        cursor_pos += 1
+                    if get_prefix_width(lines[cur_line], cur_col, font) > threshold:
+                        line = lines[cur_line]
+                        lines[cur_line:cur_line + 1] = [line[:cur_col], line[cur_col:]]
+                        cur_line += 1
+                        cur_col = 0
                         total_chars_typed += 1
 
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
-                    mx, my = pygame.mouse.get_pos()
-                    # Click on scrollbar will be handled after thumb geometry is calculated
+                    lmb_down_events.append(event)
                 # Wheel scrolling
                 elif event.button == 4:
                     scroll_offset += 20
@@ -340,26 +412,37 @@ def main():
             mx, my = pygame.mouse.get_pos()
             mouse_x_series.append(mx)
             mouse_y_series.append(my)
-            chars_typed_series.append(total_chars_typed)
-            backspaces_series.append(total_backspaces_typed)
+            if num_samples == len(chars_typed_series):
+                # Double the buffers once they are full
+                chars_typed_series = np.concatenate((chars_typed_series, np.empty_like(chars_typed_series)))
+                backspaces_series = np.concatenate((backspaces_series, np.empty_like(backspaces_series)))
+            chars_typed_series[num_samples] = total_chars_typed
+            backspaces_series[num_samples] = total_backspaces_typed
+            num_samples += 1
             elapsed_time -= interval_length
         
-        # Analyze data periodically
-        if analysis_elapsed >= analysis_interval and len(chars_typed_series) >= INTERVAL_LENGTH:
-            copy_results = predict_typing(chars_typed_series, backspaces_series, clf, best_thresh)
+        # Pick up the result of a finished background analysis
+        if analysis_future is not None and analysis_future.done():
+            copy_results = analysis_future.result()
+            analysis_future = None
+
+        # Analyze data periodically, in the background so frames keep rendering.
+        # Samples that were already written never change, so the slices are safe to share.
+        if analysis_elapsed >= analysis_interval and num_samples >= INTERVAL_LENGTH and analysis_future is None:
+            analysis_future = analysis_executor.submit(
+                predict_typing,
+                chars_typed_series[:num_samples], backspaces_series[:num_samples], booster, best_thresh
+            )
             analysis_elapsed = 0
 
         # Background gradient
-        for y in range(screen_height):
-            color_value = 20 + min(35, int(y * 0.2))
-            pygame.draw.line(screen, (color_value, color_value, color_value + 10), (0, y), (screen_width, y))
+        screen.blit(gradient_surf, (0, 0))
 
         # Calculate text layout
-        lines = typed_text.split("\n")
+        prune_line_cache(lines)
         total_text_height = 0
         for line in lines:
-            surf = font.render(line, True, (255, 255, 255))
-            total_text_height += surf.get_height() + line_spacing
+            total_text_height += get_line_layout(line, font)[0] + line_spacing
         if total_text_height > 0:
             total_text_height -= line_spacing  # remove extra spacing below last line
 
@@ -387,24 +470,20 @@ def main():
             thumb_y = scrollbar_y + thumb_travel * scroll_position
 
         # Check for new click on thumb or text to update caret
-        mouse_buttons = pygame.mouse.get_pressed()
-        if mouse_buttons[0]:
-            for e in pygame.event.get(pygame.MOUSEBUTTONDOWN):
-                if e.button == 1:
-                    mx, my = pygame.mouse.get_pos()
-                    if (mx >= scrollbar_x and mx <= scrollbar_x + scrollbar_width
-                        and my >= thumb_y and my <= thumb_y + thumb_height):
-                        dragging_scrollbar = True
-                        drag_offset_y = my - thumb_y
-                    else:
-                        if my > top_margin and my < screen_height - bottom_margin:
-                            if not (mx >= scrollbar_x and mx <= scrollbar_x + scrollbar_width):
-                                new_pos = find_cursor_pos_from_click(
-                                    mx, my, typed_text, font, line_spacing, scroll_offset,
-                                    x_text_offset, top_margin
-                                )
-                                cursor_pos = new_pos
-        else:
+        for e in lmb_down_events:
+            mx, my = e.pos
+            if (mx >= scrollbar_x and mx <= scrollbar_x + scrollbar_width
+                and my >= thumb_y and my <= thumb_y + thumb_height):
+                dragging_scrollbar = True
+                drag_offset_y = my - thumb_y
+            else:
+                if my > top_margin and my < screen_height - bottom_margin:
+                    if not (mx >= scrollbar_x and mx <= scrollbar_x + scrollbar_width):
+                        cur_line, cur_col = find_cursor_pos_from_click(
+                            mx, my, lines, font, line_spacing, scroll_offset,
+                            x_text_offset, top_margin
+                        )
+        if not pygame.mouse.get_pressed()[0]:
             dragging_scrollbar = False
 
         # Update scrollbar if dragging
@@ -429,11 +508,10 @@ def main():
         # Draw text
         y = scroll_offset
         for line in lines:
-            shadow = font.render(line, True, (0, 0, 0))
-            text_surf = font.render(line, True, (255, 255, 255))
+            line_height, _, text_surf, shadow = get_line_layout(line, font)
             screen.blit(shadow, (x_text_offset+1, y+1))
             screen.blit(text_surf, (x_text_offset, y))
-            y += text_surf.get_height() + line_spacing
+            y += line_height + line_spacing
 
         # Draw scrollbar track
         pygame.draw.rect(screen, (60, 60, 70), 
@@ -446,7 +524,7 @@ def main():
 
         # Draw caret
         if cursor_visible:
-            cx, cy, ch = get_caret_xy(typed_text, cursor_pos, font, line_spacing, scroll_offset, x_text_offset)
+            cx, cy, ch = get_caret_xy(lines, cur_line, cur_col, font, line_spacing, scroll_offset, x_text_offset)
             pygame.draw.line(screen, (0, 0, 0), (cx+1, cy+1), (cx+1, cy+ch+1), 2)
             pygame.draw.line(screen, (255, 255, 255), (cx, cy), (cx, cy+ch), 2)
         
@@ -500,13 +578,14 @@ def main():
     # Save the data when exiting
     with open("keystrokes.csv", "w", newline="") as f:
         w = csv.writer(f)
-        w.writerow(backspaces_series)
-        w.writerow(chars_typed_series)
+        w.writerow(backspaces_series[:num_samples])
+        w.writerow(chars_typed_series[:num_samples])
     
     # Save the text content when exiting
     with open("text_content.txt", "w", encoding="utf-8") as f:
-        f.write(typed_text)
+        f.write("\n".join(lines))
     
+    analysis_executor.shutdown(cancel_futures=True)
     pygame.quit()
     sys.exit()
 